@@ -3,18 +3,20 @@ from __future__ import annotations
 
 import sys
 import os
+import re
 import asyncio
+from collections import OrderedDict
 from time import time
-from typing import Dict, Tuple, Any, Optional
+from typing import Dict, Any, Optional
 from pathlib import Path
-from urllib.parse import urlsplit, urlunsplit, quote
+from urllib.parse import urljoin, urlsplit, urlunsplit, quote
 
-from fastapi import FastAPI, Request, Form, HTTPException, Query
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi import BackgroundTasks, FastAPI, Request, Form, HTTPException, Query
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel, HttpUrl
+from pydantic import HttpUrl
 
-from .seo import analyze as analyze_url
+from .seo import analyze as analyze_url, fetch as fetch_url, aclose_client
 from .db import init_db, save_analysis
 
 # ---- Windows asyncio policy fix (safe no-op elsewhere)
@@ -23,17 +25,95 @@ if sys.platform.startswith("win"):
         asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
     except Exception:
         pass
+else:
+    # uvloop (ships with uvicorn[standard]) for faster socket I/O/scheduling
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except Exception:
+        pass
 
-app = FastAPI(title="SEO Analyzer")
+# orjson serializes the large analysis dicts several times faster than stdlib json
+app = FastAPI(title="SEO Analyzer", default_response_class=ORJSONResponse)
 
 # ---- Templates dir (app/templates by default; overridable via env)
 BASE_DIR = Path(__file__).resolve().parent
 TEMPLATES_DIR = Path(os.getenv("TEMPLATES_DIR") or (BASE_DIR / "templates"))
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
+# Persist compiled template bytecode across restarts (best-effort: falls back
+# to in-memory compilation if the cache dir is unusable).
+try:
+    from jinja2 import FileSystemBytecodeCache
+    _JINJA_CACHE_DIR = Path(os.getenv("JINJA_CACHE_DIR") or "/tmp/seo_insight_jinja_cache")
+    _JINJA_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    templates.env.bytecode_cache = FileSystemBytecodeCache(str(_JINJA_CACHE_DIR))
+except Exception:
+    pass
+
+
+def _precompile_templates() -> None:
+    """Compile all templates up front so the first request skips parse+compile."""
+    try:
+        for name in templates.env.list_templates(extensions=("html",)):
+            templates.env.get_template(name)
+    except Exception:
+        pass
+
+class TTLCache:
+    """Tiny LRU cache with per-entry TTL; bounded so it cannot grow unchecked."""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 15 * 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        hit = self._data.get(key)
+        if not hit:
+            return None
+        ts, value = hit
+        if time() - ts > self.ttl:
+            self._data.pop(key, None)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        self._data[key] = (time(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
 # ---- Simple cache for AMP compare (best-effort)
-COMPARE_CACHE: Dict[str, Tuple[float, dict]] = {}
-COMPARE_TTL = 15 * 60  # seconds
+COMPARE_CACHE = TTLCache(maxsize=int(os.getenv("COMPARE_CACHE_MAX", "256")),
+                         ttl=float(os.getenv("COMPARE_CACHE_TTL", str(15 * 60))))
+
+# ---- Short-lived cache over analyze(): /analyze, its warm task and
+# /amp-compare hit the same URLs within seconds of each other.
+ANALYZE_CACHE = TTLCache(maxsize=int(os.getenv("ANALYZE_CACHE_MAX", "512")),
+                         ttl=float(os.getenv("ANALYZE_CACHE_TTL", "300")))
+_ANALYZE_LOCKS: Dict[str, asyncio.Lock] = {}
+
+
+async def _analyze_cached(url: str) -> dict:
+    """analyze() with a TTL cache and per-URL coalescing of inflight calls."""
+    cached = ANALYZE_CACHE.get(url)
+    if cached is not None:
+        return cached
+    lock = _ANALYZE_LOCKS.setdefault(url, asyncio.Lock())
+    try:
+        async with lock:
+            cached = ANALYZE_CACHE.get(url)
+            if cached is not None:
+                return cached
+            result = await analyze_url(url)
+            ANALYZE_CACHE.put(url, result)
+            return result
+    finally:
+        if not lock.locked():
+            _ANALYZE_LOCKS.pop(url, None)
 
 
 def _val(d: Any, *path: str, default=None):
@@ -52,11 +132,18 @@ def _yesno(b: Any) -> str:
     return "Yes" if bool(b) else "No"
 
 
+# Already-normal URLs (https?://lowercase-host/path, no fragment) pass through
+# untouched; only the rest pay for urlsplit/urlunsplit.
+_URL_FAST = re.compile(r"^https?://[a-z0-9.\-]+(?::\d+)?/[^#]*$")
+
+
 def _norm_url(url: str) -> str:
     """Normalize URL for caching/redirects (add scheme, lowercase host, strip fragment)."""
     if not url:
         return url
     u = url.strip()
+    if _URL_FAST.match(u):
+        return u
     if u.startswith("//"):
         u = "https:" + u
     elif not u.startswith("http://") and not u.startswith("https://"):
@@ -66,14 +153,69 @@ def _norm_url(url: str) -> str:
     return urlunsplit((parts.scheme, netloc, parts.path or "/", parts.query, ""))
 
 
-async def build_amp_compare_payload(url: str, request: Request | None):
+def _h1s(d: Any) -> list:
+    return _val(d, "headings", "h1", default=[]) or []
+
+
+def _dash(v: Any) -> Any:
+    return v if v not in (None, "") else "—"
+
+
+# One (label, extractor, display formatter) entry per compare row. The
+# extractor runs once per side; "changed" compares the raw values.
+_COMPARE_ROW_SPECS = [
+    ("Title", lambda d: _val(d, "title"), _dash),
+    ("Meta Description", lambda d: _val(d, "description"), _dash),
+    ("Canonical", lambda d: _val(d, "canonical"), _dash),
+    ("Robots Meta", lambda d: _val(d, "robots_meta"), _dash),
+    ("H1 Count", lambda d: len(_h1s(d)), lambda v: v),
+    ("First H1", lambda d: _h1s(d)[0] if _h1s(d) else None, _dash),
+    ("Open Graph present", lambda d: bool(d.get("has_open_graph")), _yesno),
+    ("Twitter Card present", lambda d: bool(d.get("has_twitter_card")), _yesno),
+]
+
+
+# Cheap AMP hint: regex over raw HTML, much lighter than a full analyze pass
+_AMPHTML_LINK_RE = re.compile(rb"<link[^>]+rel=[\"']?amphtml[\"']?[^>]*>", re.I)
+_HREF_RE = re.compile(rb"href=[\"']([^\"']+)[\"']", re.I)
+
+
+async def _sniff_amp_url(url: str) -> Optional[str]:
+    """Fetch the page and pull <link rel='amphtml'> out with a regex."""
+    try:
+        _, body, _, _ = await fetch_url(url)
+        # <link rel=amphtml> lives in <head>; scanning the first 64 KiB of
+        # bytes is enough and keeps the regex off multi-MB bodies
+        m = _AMPHTML_LINK_RE.search(body[:65536] if body else b"")
+        if not m:
+            return None
+        h = _HREF_RE.search(m.group(0))
+        if h:
+            return urljoin(url, h.group(1).decode("utf-8", "ignore"))
+    except Exception:
+        pass
+    return None
+
+
+async def build_amp_compare_payload(url: str, request: Request | None, amp_hint: Optional[str] = None):
     """
     Returns dict suitable for amp_compare.html:
     { request, url, amp_url, rows, error }
+
+    The base analysis runs as a task while the AMP URL is resolved (either the
+    caller-provided hint or a cheap sniff), so both analyses overlap instead of
+    running back-to-back.
     """
-    base = await analyze_url(url)
-    amp_url = base.get("amp_url")
+    base_task = asyncio.create_task(_analyze_cached(url))
+    if amp_hint is None:
+        amp_hint = await _sniff_amp_url(url)
+    amp_task = asyncio.create_task(_analyze_cached(amp_hint)) if amp_hint else None
+
+    base = await base_task
+    amp_url = base.get("amp_url") or amp_hint
     if not amp_url:
+        if amp_task:
+            amp_task.cancel()
         return {
             "request": request,
             "url": url,
@@ -82,59 +224,17 @@ async def build_amp_compare_payload(url: str, request: Request | None):
             "error": "No AMP version found via <link rel='amphtml'>.",
         }
 
-    amp = await analyze_url(amp_url)
+    if amp_task is not None and amp_hint == amp_url:
+        amp = await amp_task
+    else:
+        if amp_task:
+            amp_task.cancel()
+        amp = await _analyze_cached(amp_url)
 
     rows = [
-        {
-            "label": "Title",
-            "non_amp": _val(base, "title", default="—"),
-            "amp": _val(amp, "title", default="—"),
-            "changed": _val(base, "title") != _val(amp, "title"),
-        },
-        {
-            "label": "Meta Description",
-            "non_amp": _val(base, "description", default="—"),
-            "amp": _val(amp, "description", default="—"),
-            "changed": _val(base, "description") != _val(amp, "description"),
-        },
-        {
-            "label": "Canonical",
-            "non_amp": _val(base, "canonical", default="—"),
-            "amp": _val(amp, "canonical", default="—"),
-            "changed": _val(base, "canonical") != _val(amp, "canonical"),
-        },
-        {
-            "label": "Robots Meta",
-            "non_amp": _val(base, "robots_meta", default="—"),
-            "amp": _val(amp, "robots_meta", default="—"),
-            "changed": _val(base, "robots_meta") != _val(amp, "robots_meta"),
-        },
-        {
-            "label": "H1 Count",
-            "non_amp": len(_val(base, "headings", "h1", default=[]) or []),
-            "amp": len(_val(amp, "headings", "h1", default=[]) or []),
-            "changed": len(_val(base, "headings", "h1", default=[]) or [])
-            != len(_val(amp, "headings", "h1", default=[]) or []),
-        },
-        {
-            "label": "First H1",
-            "non_amp": (_val(base, "headings", "h1", default=[None]) or [None])[0] or "—",
-            "amp": (_val(amp, "headings", "h1", default=[None]) or [None])[0] or "—",
-            "changed": (_val(base, "headings", "h1", default=[None]) or [None])[0]
-            != (_val(amp, "headings", "h1", default=[None]) or [None])[0],
-        },
-        {
-            "label": "Open Graph present",
-            "non_amp": _yesno(base.get("has_open_graph")),
-            "amp": _yesno(amp.get("has_open_graph")),
-            "changed": bool(base.get("has_open_graph")) != bool(amp.get("has_open_graph")),
-        },
-        {
-            "label": "Twitter Card present",
-            "non_amp": _yesno(base.get("has_twitter_card")),
-            "amp": _yesno(amp.get("has_twitter_card")),
-            "changed": bool(base.get("has_twitter_card")) != bool(amp.get("has_twitter_card")),
-        },
+        {"label": label, "non_amp": fmt(bv), "amp": fmt(av), "changed": bv != av}
+        for label, extract, fmt in _COMPARE_ROW_SPECS
+        for bv, av in ((extract(base), extract(amp)),)
     ]
 
     return {
@@ -147,22 +247,16 @@ async def build_amp_compare_payload(url: str, request: Request | None):
 
 
 def _compare_cache_put(url: str, payload: dict):
-    COMPARE_CACHE[url] = (time(), payload)
+    COMPARE_CACHE.put(url, payload)
 
 
 def _compare_cache_get(url: str) -> dict | None:
-    hit = COMPARE_CACHE.get(url)
-    if not hit:
-        return None
-    ts, payload = hit
-    if time() - ts > COMPARE_TTL:
-        return None
-    return payload
+    return COMPARE_CACHE.get(url)
 
 
-async def _warm_compare_async(url: str):
+async def _warm_compare_async(url: str, amp_hint: Optional[str] = None):
     try:
-        payload = await build_amp_compare_payload(url, request=None)
+        payload = await build_amp_compare_payload(url, request=None, amp_hint=amp_hint)
         _compare_cache_put(url, payload)
     except Exception:
         pass
@@ -172,6 +266,12 @@ async def _warm_compare_async(url: str):
 @app.on_event("startup")
 async def on_startup():
     init_db()
+    _precompile_templates()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await aclose_client()
 
 
 # ---- Pages
@@ -189,16 +289,17 @@ async def analyze_post(url: str = Form(...)):
 
 @app.get("/analyze", response_class=HTMLResponse)
 @app.get("/analyze/", response_class=HTMLResponse)
-async def analyze_get(request: Request, url: Optional[str] = Query(None)):
+async def analyze_get(request: Request, background_tasks: BackgroundTasks, url: Optional[str] = Query(None)):
     if not url:
         return templates.TemplateResponse("index.html", {"request": request, "result": None})
 
     norm = _norm_url(url)
     try:
-        result = await analyze_url(norm)
+        result = await _analyze_cached(norm)
 
-        # Persist to DB
-        save_analysis(
+        # Persist after the response; the blocking DB write stays off the request path
+        background_tasks.add_task(
+            save_analysis,
             url=norm,
             result=result,
             status_code=int(result.get("status_code") or 0),
@@ -208,7 +309,7 @@ async def analyze_get(request: Request, url: Optional[str] = Query(None)):
         )
 
         if result.get("amp_url"):
-            asyncio.create_task(_warm_compare_async(result["url"]))
+            asyncio.create_task(_warm_compare_async(result["url"], amp_hint=result.get("amp_url")))
 
         return templates.TemplateResponse("index.html", {"request": request, "result": result})
     except Exception as e:
@@ -216,17 +317,14 @@ async def analyze_get(request: Request, url: Optional[str] = Query(None)):
 
 
 # ---- API
-class AnalyzeQuery(BaseModel):
-    url: HttpUrl
-
-
-@app.get("/api/analyze", response_class=JSONResponse)
-async def api_analyze(url: HttpUrl):
+@app.get("/api/analyze", response_class=ORJSONResponse)
+async def api_analyze(url: HttpUrl, background_tasks: BackgroundTasks):
     norm = _norm_url(str(url))
     try:
-        result = await analyze_url(norm)
+        result = await _analyze_cached(norm)
 
-        save_analysis(
+        background_tasks.add_task(
+            save_analysis,
             url=norm,
             result=result,
             status_code=int(result.get("status_code") or 0),
@@ -236,14 +334,17 @@ async def api_analyze(url: HttpUrl):
         )
 
         if result.get("amp_url"):
-            asyncio.create_task(_warm_compare_async(result["url"]))
+            asyncio.create_task(_warm_compare_async(result["url"], amp_hint=result.get("amp_url")))
 
-        return JSONResponse(result)
+        return ORJSONResponse(result)
     except Exception as e:
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 
 # ---- AMP vs Non-AMP comparison page (unchanged feature)
+_COMPARE_LOCKS: Dict[str, asyncio.Lock] = {}
+
+
 @app.get("/amp-compare", response_class=HTMLResponse)
 async def amp_compare(request: Request, url: str):
     cached = _compare_cache_get(url)
@@ -252,6 +353,19 @@ async def amp_compare(request: Request, url: str):
         payload["request"] = request
         return templates.TemplateResponse("amp_compare.html", payload)
 
-    payload = await build_amp_compare_payload(url, request)
-    _compare_cache_put(url, dict(payload, request=None))
+    # Coalesce concurrent cold requests for the same URL into one build;
+    # late arrivals wake up to a warm cache instead of refetching.
+    lock = _COMPARE_LOCKS.setdefault(url, asyncio.Lock())
+    try:
+        async with lock:
+            cached = _compare_cache_get(url)
+            if cached:
+                payload = dict(cached)
+                payload["request"] = request
+            else:
+                payload = await build_amp_compare_payload(url, request)
+                _compare_cache_put(url, dict(payload, request=None))
+    finally:
+        if not lock.locked():
+            _COMPARE_LOCKS.pop(url, None)
     return templates.TemplateResponse("amp_compare.html", payload)
@@ -5,12 +5,20 @@ import os
 import re
 import json
 import time
+import asyncio
 import inspect
+from collections import Counter
 from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import urljoin, urlsplit
 
 import httpx
 from bs4 import BeautifulSoup
+from bs4.element import PreformattedString  # Comment, Doctype, CData, PIs
+
+try:
+    import orjson  # noticeably faster for the large JSON-LD blobs news pages ship
+except ImportError:  # pragma: no cover
+    orjson = None
 
 # =========================
 # Fast, universal static scan
@@ -35,6 +43,11 @@ PSI_API_KEY = os.getenv("GOOGLE_PSI_API_KEY") or os.getenv("PAGESPEED_API_KEY")
 
 # WAF cooldown
 WAF_COOLDOWN_SEC = int(os.getenv("WAF_COOLDOWN_SEC", "900"))
+
+# Cap how much of a page body we download: everything the analyzer inspects
+# (head, links, images, ld+json) lives well within the first couple of MB,
+# so huge CMS pages shouldn't cost unbounded memory and parse time.
+MAX_FETCH_BYTES = int(os.getenv("MAX_FETCH_BYTES", "2000000"))
 _WAF_COOLDOWN: Dict[str, float] = {}  # host -> until_ts
 
 
@@ -50,15 +63,19 @@ def _enter_cooldown(h: str):
     _WAF_COOLDOWN[h] = time.time() + WAF_COOLDOWN_SEC
 
 
+_WAF_SIGNALS = (
+    b"access denied", b"request blocked", b"you have been blocked",
+    b"the owner of this website", b"reference #", b"malicious or automated"
+)
+
+
 def _looks_like_waf(html_bytes: bytes) -> bool:
     if not html_bytes:
         return False
-    t = html_bytes[:8000].decode(errors="ignore").lower()
-    signals = (
-        "access denied", "request blocked", "you have been blocked",
-        "the owner of this website", "reference #", "malicious or automated"
-    )
-    return any(s in t for s in signals)
+    # scan raw bytes; the signals are ASCII so bytes.lower() is equivalent
+    # and skips the decode + str copy of the old path
+    t = html_bytes[:8000].lower()
+    return any(s in t for s in _WAF_SIGNALS)
 
 
 def _origin_referer(u: str) -> str:
@@ -119,29 +136,92 @@ def _client_kwargs(base_kwargs: Dict[str, Any]) -> Dict[str, Any]:
 # HTTP (static)
 # ============
 
+# One pooled client for the whole process: connections (and TLS sessions) are
+# reused across analyses instead of paying a fresh handshake per fetch. HTTP/2
+# lets base page, AMP page, robots.txt etc. multiplex over one connection.
+_CLIENT: Optional[httpx.AsyncClient] = None
+
+# Validators for conditional GETs: keep the last body per URL alongside its
+# ETag/Last-Modified so a repeat fetch can revalidate and reuse on 304 -- no
+# body transfer, no reparse. Bounded small because entries hold full bodies.
+VALIDATOR_CACHE_MAX = int(os.getenv("VALIDATOR_CACHE_MAX", "64"))
+_VALIDATOR_CACHE: Dict[str, Dict[str, Any]] = {}
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        kwargs = _client_kwargs({
+            "follow_redirects": True,
+            "timeout": DEFAULT_TIMEOUT,
+            "trust_env": True,
+            "limits": httpx.Limits(max_keepalive_connections=10, max_connections=20),
+        })
+        try:
+            _CLIENT = httpx.AsyncClient(http2=True, **kwargs)
+        except ImportError:
+            # h2 not installed; fall back to HTTP/1.1 with pooling
+            _CLIENT = httpx.AsyncClient(**kwargs)
+    return _CLIENT
+
+
+async def aclose_client() -> None:
+    """Close the shared client (call from app shutdown)."""
+    global _CLIENT
+    if _CLIENT is not None and not _CLIENT.is_closed:
+        await _CLIENT.aclose()
+    _CLIENT = None
+
+
 async def fetch(url: str, timeout: float = DEFAULT_TIMEOUT) -> Tuple[int, bytes, Dict[str, str], Dict[str, Any]]:
     headers = build_headers_for(url)
-    limits = httpx.Limits(max_keepalive_connections=4, max_connections=6)
-    kwargs = _client_kwargs({
-        "follow_redirects": True,
-        "headers": headers,
-        "timeout": timeout,
-        "trust_env": True,
-        "limits": limits,
-    })
-    async with httpx.AsyncClient(**kwargs) as client:
-        start = time.perf_counter()
-        resp = await client.get(url)
-        end = time.perf_counter()
-        body = resp.content or b""
-        headers_lower = {k.lower(): v for k, v in resp.headers.items()}
-        netinfo = {
-            "http_version": getattr(resp, "http_version", "HTTP/1.1"),
-            "final_url": str(resp.url),
-            "redirects": len(resp.history),
-            "status_code": resp.status_code,
+    prev = _VALIDATOR_CACHE.get(url)
+    if prev:
+        if prev.get("etag"):
+            headers["If-None-Match"] = prev["etag"]
+        if prev.get("last_modified"):
+            headers["If-Modified-Since"] = prev["last_modified"]
+    client = _get_client()
+    start = time.perf_counter()
+    async with client.stream("GET", url, headers=headers, timeout=timeout) as resp:
+        chunks: List[bytes] = []
+        got = 0
+        async for chunk in resp.aiter_bytes():
+            chunks.append(chunk)
+            got += len(chunk)
+            if got >= MAX_FETCH_BYTES:
+                break
+        body = b"".join(chunks)
+    end = time.perf_counter()
+    load_ms = int((end - start) * 1000)
+    if resp.status_code == 304 and prev:
+        # Not modified: the cached body and headers still describe the page.
+        # Re-insert so FIFO eviction treats the entry as fresh.
+        _VALIDATOR_CACHE.pop(url, None)
+        _VALIDATOR_CACHE[url] = prev
+        return load_ms, prev["body"], dict(prev["headers"]), dict(prev["netinfo"])
+    headers_lower = {k.lower(): v for k, v in resp.headers.items()}
+    netinfo = {
+        "http_version": getattr(resp, "http_version", "HTTP/1.1"),
+        "final_url": str(resp.url),
+        "redirects": len(resp.history),
+        "status_code": resp.status_code,
+        "truncated": got >= MAX_FETCH_BYTES,
+    }
+    etag = headers_lower.get("etag")
+    last_modified = headers_lower.get("last-modified")
+    if resp.status_code == 200 and body and (etag or last_modified):
+        _VALIDATOR_CACHE.pop(url, None)
+        if len(_VALIDATOR_CACHE) >= VALIDATOR_CACHE_MAX:
+            _VALIDATOR_CACHE.pop(next(iter(_VALIDATOR_CACHE)))
+        _VALIDATOR_CACHE[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "body": body,
+            "headers": headers_lower,
+            "netinfo": netinfo,
         }
-    return int((end - start) * 1000), body, headers_lower, netinfo
+    return load_ms, body, headers_lower, netinfo
 
 
 # ==================
@@ -156,27 +236,30 @@ def _text(node) -> Optional[str]:
 
 
 def _safe_json_loads(s: str) -> Any:
+    if orjson is not None:
+        try:
+            # orjson rejects str subclasses, and bs4 hands us NavigableString
+            return orjson.loads(s if type(s) is str else str(s))
+        except Exception:
+            pass  # fall through: stdlib json accepts a few things orjson won't
     try:
         return json.loads(s)
     except Exception:
         return None
 
 
-def _norm_list(urls: List[str]) -> List[str]:
-    seen, out = set(), []
-    for u in urls:
-        if not u:
-            continue
-        if u not in seen:
-            seen.add(u); out.append(u)
-    return out
+_LDJSON_TYPE_RE = re.compile(r"ld\+json", re.I)
 
 
-def extract_structured_data_full(body: bytes, base_url: str) -> Dict[str, Any]:
-    soup = BeautifulSoup(body, "lxml")
+def _jsonld_from_scripts(tags: List[Any]) -> List[Any]:
     json_ld: List[Any] = []
-    for tag in soup.find_all("script", type=lambda v: v and "ld+json" in v.lower()):
+    for tag in tags:
         txt = tag.string or tag.get_text() or ""
+        # Cheap C-level substring test before the real parse: a block with
+        # none of these markers isn't JSON-LD we can use (ad/config JSON
+        # mislabeled as ld+json shows up on news sites).
+        if '"@type"' not in txt and '"@graph"' not in txt and '"@context"' not in txt:
+            continue
         data = _safe_json_loads(txt)
         if data is None:
             continue
@@ -186,13 +269,14 @@ def extract_structured_data_full(body: bytes, base_url: str) -> Dict[str, Any]:
             json_ld.extend([x for x in data if isinstance(x, dict)])
         elif isinstance(data, dict):
             json_ld.append(data)
+    return json_ld
 
-    microdata = soup.select("[itemscope]")
-    rdfa = soup.select("[vocab], [typeof], [property]")
+
+def _sd_payload(json_ld: List[Any], md_count: int, rdfa_count: int) -> Dict[str, Any]:
     return {
         "json_ld": json_ld,
-        "microdata": [{"count": len(microdata)}] if microdata else [],
-        "rdfa": [{"count": len(rdfa)}] if rdfa else [],
+        "microdata": [{"count": md_count}] if md_count else [],
+        "rdfa": [{"count": rdfa_count}] if rdfa_count else [],
     }
 
 
@@ -255,96 +339,225 @@ def structured_types_present(jsonld: List[Any]) -> Dict[str, Any]:
     return {"types": sorted(types)}
 
 
-def _extract_text_for_density(soup: BeautifulSoup) -> str:
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-    return soup.get_text(separator=" ", strip=True)
+_TEXT_SKIP_TAGS = frozenset({"script", "style", "noscript"})
+
+
+_STOPWORDS = frozenset({
+    "the","and","for","are","but","not","you","your","with","have","this","that","was","from","they",
+    "his","her","she","him","has","had","were","will","what","when","where","who","why","how","can",
+    "all","any","each","few","more","most","other","some","such","no","nor","too","very","of","to",
+    "in","on","by","is","as","at","it","or","be","we","an","a","our","us","if","out","up","so","do",
+    "did","does","their","its","than","then",
+})
+_WORD_RE = re.compile(r"[A-Za-z]{3,}")
+
+
+def _density_from_counts(freq: Counter, top_n: int) -> List[Dict[str, Any]]:
+    total = sum(freq.values()) or 1
+    return [{"word": w, "count": c, "percent": round(100.0 * c / total, 2)}
+            for w, c in freq.most_common(top_n)]
 
 
 def keyword_density(text: str, top_n: int = 10) -> List[Dict[str, Any]]:
-    STOPWORDS = {"the","and","for","are","but","not","you","your","with","have","this","that","was","from","they",
-                 "his","her","she","him","has","had","were","will","what","when","where","who","why","how","can",
-                 "all","any","each","few","more","most","other","some","such","no","nor","too","very","of","to",
-                 "in","on","by","is","as","at","it","or","be","we","an","a","our","us","if","out","up","so","do",
-                 "did","does","their","its","than","then"}
-    words = re.findall(r"[A-Za-z]{3,}", text.lower())
-    freq: Dict[str, int] = {}
-    for w in words:
-        if w in STOPWORDS:
+    freq = Counter(w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS)
+    return _density_from_counts(freq, top_n)
+
+
+def keyword_density_from_soup(soup: BeautifulSoup, top_n: int = 10) -> List[Dict[str, Any]]:
+    """Tokenize visible text straight off the tree: no decompose() mutation
+    and no whole-document string ever gets materialized."""
+    freq: Counter = Counter()
+    findall = _WORD_RE.findall
+    # Ancestor walks are only needed when the page has a noscript at all:
+    # script/style hold raw text (their strings' direct parent is the tag),
+    # but noscript can nest real markup.
+    has_noscript = soup.find("noscript") is not None
+    for s in soup.find_all(string=True):
+        # Comments, doctype, CDATA and processing instructions aren't text
+        if isinstance(s, PreformattedString):
             continue
-        freq[w] = freq.get(w, 0) + 1
-    total = sum(freq.values()) or 1
-    items = sorted(freq.items(), key=lambda kv: kv[1], reverse=True)[:top_n]
-    return [{"word": w, "count": c, "percent": round(100.0 * c / total, 2)} for w, c in items]
+        parent = s.parent
+        if parent is not None and parent.name in _TEXT_SKIP_TAGS:
+            continue
+        if has_noscript and s.find_parent("noscript") is not None:
+            continue
+        freq.update(w for w in findall(str(s).lower()) if w not in _STOPWORDS)
+    return _density_from_counts(freq, top_n)
 
 
 # ------------
 # parse_html()
 # ------------
 
+_CHARSET_HDR_RE = re.compile(r"charset=([\w\-]+)", re.I)
+
+
 def parse_html(url: str, body: bytes, headers: Dict[str, str], load_ms: int) -> Dict[str, Any]:
-    soup = BeautifulSoup(body or b"", "lxml")
+    # Use the charset the server declared so bs4 can skip encoding detection
+    # (falls back to sniffing when the header is absent or wrong).
+    m = _CHARSET_HDR_RE.search(headers.get("content-type") or "")
+    soup = BeautifulSoup(body or b"", "lxml", from_encoding=m.group(1) if m else None)
+
+    # ---- single traversal: bucket every tag kind the extractors below read.
+    # Each find_all walks the whole tree, and parse_html used to do ~15 of
+    # them; one pass over soup.find_all(True) collects it all.
+    heading_texts: Dict[str, List[str]] = {"h1": [], "h2": [], "h3": [], "h4": [], "h5": [], "h6": []}
+    meta_nodes: List[Any] = []
+    link_nodes: List[Any] = []
+    anchor_nodes: List[Any] = []
+    img_nodes: List[Any] = []
+    ld_scripts: List[Any] = []
+    md_count = rdfa_count = 0
+    title_node = None
+    html_node = None
+
+    # bind hot lookups to locals; this loop runs once per DOM node
+    add_meta = meta_nodes.append
+    add_anchor = anchor_nodes.append
+    add_img = img_nodes.append
+    add_link = link_nodes.append
+    add_ld = ld_scripts.append
+    ldjson_search = _LDJSON_TYPE_RE.search
+    for el in soup.find_all(True):
+        name = el.name
+        attrs = el.attrs
+        if name == "meta":
+            add_meta(el)
+        elif name == "a":
+            if "href" in attrs:
+                add_anchor(el)
+        elif name == "img":
+            add_img(el)
+        elif name == "link":
+            add_link(el)
+        elif name in heading_texts:
+            t = _text(el)
+            if t:
+                heading_texts[name].append(t)
+        elif name == "script":
+            if ldjson_search(attrs.get("type") or ""):
+                add_ld(el)
+        elif name == "title":
+            if title_node is None:
+                title_node = el
+        elif name == "html":
+            if html_node is None:
+                html_node = el
+        if "itemscope" in attrs:
+            md_count += 1
+        if "vocab" in attrs or "typeof" in attrs or "property" in attrs:
+            rdfa_count += 1
+
+    # metas: og/twitter plus the named fields, resolved in one loop
+    description = robots_meta = charset = http_equiv_charset = None
+    viewport_value = ""
+    open_graph: Dict[str, str] = {}
+    twitter_card: Dict[str, str] = {}
+    for m_tag in meta_nodes:
+        prop = m_tag.get("property")
+        if prop:
+            pl = prop.lower()
+            if pl.startswith("og:"):
+                open_graph[pl] = m_tag.get("content", "")
+        name = m_tag.get("name")
+        if name:
+            nl = name.lower()
+            content = m_tag.get("content")
+            if nl.startswith("twitter:"):
+                twitter_card[nl] = m_tag.get("content", "")
+            elif nl == "description":
+                if description is None and content:
+                    description = content.strip()
+            elif nl == "robots":
+                if robots_meta is None and content:
+                    robots_meta = content.strip()
+            elif nl == "viewport":
+                if not viewport_value and content:
+                    viewport_value = content.strip()
+        if charset is None and m_tag.get("charset"):
+            charset = m_tag.get("charset")
+        if (http_equiv_charset is None
+                and (m_tag.get("http-equiv") or "").lower() == "content-type"):
+            c = (m_tag.get("content") or "").lower()
+            if "charset=" in c:
+                http_equiv_charset = c.split("charset=", 1)[-1].strip()
+    if not charset:
+        charset = http_equiv_charset
 
     # basics
-    title = (soup.title.string.strip() if soup.title and soup.title.string else None)
+    title = (title_node.string.strip() if title_node and title_node.string else None)
     if not title:
-        ogt = soup.find("meta", attrs={"property": "og:title"})
-        title = ogt.get("content").strip() if ogt and ogt.get("content") else None
-
-    desc = soup.find("meta", attrs={"name": "description"})
-    description = (desc.get("content").strip() if desc and desc.get("content") else None)
-
-    can = soup.find("link", rel=lambda v: v and "canonical" in [r.lower() for r in (v if isinstance(v, list) else [v])])
-    canonical = can.get("href").strip() if can and can.get("href") else None
-
-    rob = soup.find("meta", attrs={"name": "robots"})
-    robots_meta = (rob.get("content").strip() if rob and rob.get("content") else None)
+        ogt = open_graph.get("og:title")
+        title = ogt.strip() if ogt else None
 
-    # og / twitter
-    open_graph: Dict[str, str] = {}
-    for m in soup.find_all("meta", attrs={"property": True}):
-        prop = m.get("property", "")
-        if prop and prop.lower().startswith("og:"):
-            open_graph[prop.lower()] = m.get("content", "")
-    twitter_card: Dict[str, str] = {}
-    for m in soup.find_all("meta", attrs={"name": True}):
-        name = m.get("name", "")
-        if name and name.lower().startswith("twitter:"):
-            twitter_card[name.lower()] = m.get("content", "")
-
-    # headings
-    headings = {
-        "h1": [_text(x) for x in soup.find_all("h1") if _text(x)],
-        "h2": [_text(x) for x in soup.find_all("h2") if _text(x)],
-        "h3": [_text(x) for x in soup.find_all("h3") if _text(x)],
-        "h4": [_text(x) for x in soup.find_all("h4") if _text(x)],
-        "h5": [_text(x) for x in soup.find_all("h5") if _text(x)],
-        "h6": [_text(x) for x in soup.find_all("h6") if _text(x)],
-    }
+    # <link> tags: canonical, amphtml, hreflang alternates
+    canonical = amp_url = None
+    canonical_seen = amp_seen = False
+    hreflang = []
+    for l in link_nodes:
+        relv = l.get("rel")
+        if not relv:
+            continue
+        rels = [r.lower() for r in (relv if isinstance(relv, list) else [relv])]
+        href = l.get("href")
+        if not canonical_seen and "canonical" in rels:
+            canonical_seen = True
+            canonical = href.strip() if href else None
+        if not amp_seen and "amphtml" in rels:
+            amp_seen = True
+            amp_url = href.strip() if href else None
+        if "alternate" in rels and href and l.get("hreflang"):
+            hreflang.append({"hreflang": l.get("hreflang"), "href": urljoin(url, href)})
+
+    # headings (already text, filtered at insertion; the top-level h1..h6
+    # keys below share these exact lists rather than copies)
+    headings = heading_texts
 
     # links
     base_host = _host(url)
-    internal, external, nofollow = [], [], []
-    for a in soup.find_all("a", href=True):
+    http_prefix = f"http://{base_host}"
+    https_prefix = f"https://{base_host}"
+    # insertion-ordered dicts double as ordered sets: dedupe happens during
+    # the partition instead of a dedupe pass per bucket afterwards
+    internal: Dict[str, None] = {}
+    external: Dict[str, None] = {}
+    nofollow: Dict[str, None] = {}
+    for a in anchor_nodes:
         href = (a.get("href") or "").strip()
         if not href:
             continue
-        absu = urljoin(url, href)
-        h = _host(absu)
-        (internal if (h == base_host or not h) else external).append(absu)
+        # Fast paths cover the bulk of real pages (site-relative links and
+        # same-origin absolutes) without a urlsplit per href; anything odd
+        # falls through to the exact host compare.
+        if href[0] in "/#?" and not href.startswith("//"):
+            absu = urljoin(url, href)
+            bucket = internal
+        elif href.startswith(https_prefix) or href.startswith(http_prefix):
+            rest = href.split(base_host, 1)[1]
+            if not rest or rest[0] in "/?#":
+                absu = href
+                bucket = internal
+            else:
+                absu = urljoin(url, href)
+                h = _host(absu)
+                bucket = internal if (h == base_host or not h) else external
+        else:
+            absu = urljoin(url, href)
+            h = _host(absu)
+            bucket = internal if (h == base_host or not h) else external
+        bucket[absu] = None
         rel = " ".join((a.get("rel") or [])).lower()
         if "nofollow" in rel:
-            nofollow.append(absu)
-    internal = _norm_list(internal)
-    external = _norm_list(external)
-    nofollow = _norm_list(nofollow)
+            nofollow[absu] = None
+    internal = list(internal)
+    external = list(external)
+    nofollow = list(nofollow)
 
     # images / alt coverage
-    imgs = soup.find_all("img")
-    total_imgs = len(imgs)
+    total_imgs = len(img_nodes)
     missing_alt = []
     alt_ok = 0
-    for im in imgs:
+    for im in img_nodes:
         alt = (im.get("alt") or "").strip()
         if alt:
             alt_ok += 1
@@ -353,58 +566,35 @@ def parse_html(url: str, body: bytes, headers: Dict[str, str], load_ms: int) ->
             missing_alt.append({"src": urljoin(url, src)} if src else {"src": ""})
     alt_percent = round(100.0 * alt_ok / total_imgs, 2) if total_imgs else 100.0
 
-    # hreflang
-    hreflang = []
-    for l in soup.find_all("link", rel=True, href=True):
-        rels = [r.lower() for r in (l.get("rel") if isinstance(l.get("rel"), list) else [l.get("rel")])]
-        if "alternate" in rels and l.get("hreflang"):
-            hreflang.append({"hreflang": l.get("hreflang"), "href": urljoin(url, l.get("href"))})
-
     # AMP
-    amp_link = soup.find("link", rel=lambda v: v and "amphtml" in [r.lower() for r in (v if isinstance(v, list) else [v])])
-    amp_url = amp_link.get("href").strip() if amp_link and amp_link.get("href") else None
     is_amp = False
     try:
-        html_tag = soup.find("html")
-        if html_tag:
-            is_amp = any(attr.lower() in ("amp", "⚡") for attr in html_tag.attrs)
+        if html_node is not None:
+            is_amp = any(attr.lower() in ("amp", "⚡") for attr in html_node.attrs)
     except Exception:
         pass
 
-    # structured data
-    sd = extract_structured_data_full(body or b"", url)
+    # structured data (from the nodes bucketed above)
+    sd = _sd_payload(_jsonld_from_scripts(ld_scripts), md_count, rdfa_count)
     sd_types = structured_types_present(sd.get("json_ld") or [])
     sd_validation = validate_jsonld(sd.get("json_ld") or [])
 
     # keyword density
-    text_content = _extract_text_for_density(soup)
-    kd_top = keyword_density(text_content, top_n=10)
+    kd_top = keyword_density_from_soup(soup, top_n=10)
 
-    # checks
-    vpm = soup.find("meta", attrs={"name": "viewport"})
-    viewport_value = vpm.get("content", "").strip() if vpm and vpm.get("content") else ""
+    # checks (viewport/charset already resolved in the meta loop above)
     robots_val = (robots_meta or "").lower()
     robots_index = "noindex" not in robots_val
     robots_follow = "nofollow" not in robots_val
     xrt = (headers.get("x-robots-tag") or "").lower()
     xrt_index = "noindex" not in xrt
     xrt_follow = "nofollow" not in xrt
-    # lang/charset
+    # lang
     lang = None
     try:
-        lang = soup.html.get("lang") if soup.html else None
+        lang = html_node.get("lang") if html_node is not None else None
     except Exception:
         pass
-    charset = None
-    mcs = soup.find("meta", attrs={"charset": True})
-    if mcs:
-        charset = mcs.get("charset")
-    if not charset:
-        mct = soup.find("meta", attrs={"http-equiv": True, "content": True})
-        if mct and str(mct.get("http-equiv", "")).lower() == "content-type":
-            c = mct.get("content", "").lower()
-            if "charset=" in c:
-                charset = c.split("charset=", 1)[-1].strip()
     # compression from headers
     enc = (headers.get("content-encoding") or "").lower()
     enc_map = {"br": "Brotli", "gzip": "gzip", "deflate": "deflate", "zstd": "zstd"}
@@ -464,48 +654,59 @@ def parse_html(url: str, body: bytes, headers: Dict[str, str], load_ms: int) ->
 # Robots/sitemaps (simple)
 # ------------------------
 
+_SITEMAP_RE = re.compile(r"(?im)^\s*sitemap:\s*(\S+)\s*$")
+
+# robots.txt rarely changes; keep the fetched text for an hour per host so
+# analyzing several pages of one site pays for it once. The parsed result
+# itself is per-path, so only the text is memoized. Failed fetches get a
+# short TTL instead: a transient timeout shouldn't blank sitemaps and the
+# robots verdict for a whole hour.
+ROBOTS_CACHE_TTL = int(os.getenv("ROBOTS_CACHE_TTL", "3600"))
+ROBOTS_FAIL_TTL = int(os.getenv("ROBOTS_FAIL_TTL", "60"))
+_ROBOTS_TXT_CACHE: Dict[str, Tuple[float, str, int]] = {}  # url -> (ts, text, ttl)
+
+
 async def robots_and_sitemaps(url: str) -> Dict[str, Any]:
-    try:
-        p = urlsplit(url)
-        robots_url = f"{p.scheme}://{p.netloc}/robots.txt"
-        kwargs = _client_kwargs({
-            "follow_redirects": True,
-            "timeout": 6 if FAST_SCAN else 10,
-        })
-        async with httpx.AsyncClient(**kwargs) as client:
-            r = await client.get(robots_url)
-            txt = r.text if r.status_code < 500 else ""
-    except Exception:
-        txt = ""
+    # split once; scheme/host/path are reused below and in the return value
+    p = urlsplit(url)
+    robots_url = f"{p.scheme}://{p.netloc}/robots.txt"
+    hit = _ROBOTS_TXT_CACHE.get(robots_url)
+    if hit and (time.time() - hit[0]) < hit[2]:
+        txt = hit[1]
+    else:
+        try:
+            r = await _get_client().get(robots_url, timeout=6 if FAST_SCAN else 10)
+            ok = r.status_code < 500
+            txt = r.text if ok else ""
+        except Exception:
+            ok = False
+            txt = ""
+        if len(_ROBOTS_TXT_CACHE) >= 512:
+            _ROBOTS_TXT_CACHE.pop(next(iter(_ROBOTS_TXT_CACHE)))
+        _ROBOTS_TXT_CACHE[robots_url] = (
+            time.time(), txt, ROBOTS_CACHE_TTL if ok else ROBOTS_FAIL_TTL
+        )
 
     sitemaps = []
     blocked = None
     if txt:
-        for line in txt.splitlines():
-            l = line.strip()
-            if not l or l.startswith("#"):
-                continue
-            if l.lower().startswith("sitemap:"):
-                sm = l.split(":", 1)[1].strip()
-                sitemaps.append({"url": sm})
+        # sitemap directives: one C-level regex scan over the whole text
+        sitemaps = [{"url": sm} for sm in dict.fromkeys(_SITEMAP_RE.findall(txt))]
         # naive disallow check for UA: *
         ua_any = False
         disallows: List[str] = []
         for line in txt.splitlines():
             l = line.strip()
-            if not l:
+            if not l or l.startswith("#"):
                 continue
             low = l.lower()
             if low.startswith("user-agent:"):
                 ua_any = ("*" in low)
             elif ua_any and low.startswith("disallow:"):
-                path = l.split(":", 1)[1].strip() or "/"
-                disallows.append(path)
-            elif low.startswith("user-agent:") and ua_any:
-                break
-        path = urlsplit(url).path or "/"
+                disallows.append(l.split(":", 1)[1].strip() or "/")
+        path = p.path or "/"
         blocked = any(path.startswith(d) for d in disallows if d)
-    return {"robots_url": f"{urlsplit(url).scheme}://{urlsplit(url).netloc}/robots.txt", "blocked_by_robots": blocked, "sitemaps": sitemaps}
+    return {"robots_url": robots_url, "blocked_by_robots": blocked, "sitemaps": sitemaps}
 
 
 # ------------------------
@@ -514,43 +715,56 @@ async def robots_and_sitemaps(url: str) -> Dict[str, Any]:
 
 async def _check_urls(urls: List[str], limit: int) -> List[Dict[str, Any]]:
     sample = urls[:limit]
-    out: List[Dict[str, Any]] = []
     if not sample:
-        return out
+        return []
     timeout = httpx.Timeout(5.0 if FAST_SCAN else 10.0)
-    kwargs = _client_kwargs({
-        "follow_redirects": True,
-        "timeout": timeout,
-        "trust_env": True,
-        "limits": httpx.Limits(max_keepalive_connections=4, max_connections=6),
-    })
-    async with httpx.AsyncClient(**kwargs) as client:
-        for u in sample:
+    client = _get_client()
+    sem = asyncio.Semaphore(4)  # polite bound; results stay in input order
+
+    async def _one(u: str) -> Dict[str, Any]:
+        async with sem:
             try:
-                r = await client.head(u)
+                r = await client.head(u, timeout=timeout)
                 # Some hosts 405/403 on HEAD → try GET quickly
                 if r.status_code in (405, 403, 400):
-                    r = await client.get(u)
-                out.append({"url": u, "final_url": str(r.url), "status": r.status_code, "redirects": len(r.history)})
+                    r = await client.get(u, timeout=timeout)
+                return {"url": u, "final_url": str(r.url), "status": r.status_code, "redirects": len(r.history)}
             except Exception as e:
-                out.append({"url": u, "final_url": u, "status": None, "error": str(e), "redirects": 0})
-    return out
+                return {"url": u, "final_url": u, "status": None, "error": str(e), "redirects": 0}
+
+    return list(await asyncio.gather(*(_one(u) for u in sample)))
 
 
 # -------------------------
 # PageSpeed Insights (opt.)
 # -------------------------
 
+# PSI runs take 15-30s and burn API quota; memoize per (strategy, url)
+PSI_CACHE_TTL = int(os.getenv("PSI_CACHE_TTL", "600"))
+_PSI_CACHE: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
 async def _fetch_psi(url: str) -> Dict[str, Any]:
     if FAST_SCAN or not PSI_API_KEY:
         return {"enabled": False, "message": "FAST_SCAN on or PSI key missing."}
     api = "https://www.googleapis.com/pagespeedonline/v5/runPagespeed"
     async def one(strategy: str) -> Dict[str, Any]:
+        key = f"{strategy}:{url}"
+        hit = _PSI_CACHE.get(key)
+        if hit and (time.time() - hit[0]) < PSI_CACHE_TTL:
+            return hit[1]
+        res = await _one_uncached(strategy)
+        if res.get("score") is not None:  # don't cache failures
+            if len(_PSI_CACHE) >= 256:
+                _PSI_CACHE.pop(next(iter(_PSI_CACHE)))
+            _PSI_CACHE[key] = (time.time(), res)
+        return res
+
+    async def _one_uncached(strategy: str) -> Dict[str, Any]:
         params = {"url": url, "strategy": strategy, "key": PSI_API_KEY, "category": "PERFORMANCE"}
         try:
-            async with httpx.AsyncClient(timeout=30) as client:
-                r = await client.get(api, params=params)
-                data = r.json()
+            r = await _get_client().get(api, params=params, timeout=30)
+            data = r.json()
         except Exception as e:
             return {"score": None, "metrics": {}, "error": str(e)}
         try:
@@ -569,7 +783,8 @@ async def _fetch_psi(url: str) -> Dict[str, Any]:
             return {"score": score, "metrics": metrics}
         except Exception as e:
             return {"score": None, "metrics": {}, "error": f"PSI parse failed: {e}"}
-    return {"enabled": True, "mobile": await one("mobile"), "desktop": await one("desktop")}
+    mobile, desktop = await asyncio.gather(one("mobile"), one("desktop"))
+    return {"enabled": True, "mobile": mobile, "desktop": desktop}
 
 
 # =========
@@ -585,9 +800,10 @@ async def analyze(url: str) -> Dict[str, Any]:
             "errors": [f"Temporarily cooled down for {host} after WAF block."],
         }
 
-    # 1) Static fetch
+    # 1) Static fetch; the CPU-bound parse runs in a worker thread so other
+    # in-flight analyses keep the event loop (lxml releases the GIL in C)
     load_ms, body, headers, netinfo = await fetch(url)
-    result = parse_html(url, body, headers, load_ms)
+    result = await asyncio.to_thread(parse_html, url, body, headers, load_ms)
 
     # Basic perf block
     result["status_code"] = int(netinfo.get("status_code") or 0)
@@ -612,11 +828,16 @@ async def analyze(url: str) -> Dict[str, Any]:
         and result["checks"]["x_robots_tag"]["ok"]
     result["checks"]["indexable"] = {"value": "Yes" if indexable else "No", "ok": indexable}
 
+    if netinfo.get("truncated"):
+        result.setdefault("notes", []).append(
+            f"Body larger than {MAX_FETCH_BYTES} bytes; analyzed the first {MAX_FETCH_BYTES}."
+        )
+
     # 2) WAF fallback: if blocked and AMP exists, analyze AMP to populate signals
     if _looks_like_waf(body) and result.get("amp_url"):
         load2, body2, hdr2, net2 = await fetch(result["amp_url"])
         if body2:
-            amp_res = parse_html(result["amp_url"], body2, hdr2, load2)
+            amp_res = await asyncio.to_thread(parse_html, result["amp_url"], body2, hdr2, load2)
             for k in ("title","description","canonical","robots_meta","open_graph","twitter_card","has_open_graph","has_twitter_card",
                       "headings","h1","h2","h3","h4","h5","h6","internal_links","external_links","nofollow_links",
                       "images_missing_alt","hreflang","json_ld","microdata","rdfa","sd_types","json_ld_validation",
@@ -628,32 +849,56 @@ async def analyze(url: str) -> Dict[str, Any]:
             _enter_cooldown(host)
             result.setdefault("errors", []).append("WAF/CDN blocked both canonical and AMP.")
 
-    # 3) Robots/sitemaps (polite)
-    try:
-        result["crawl_checks"] = await robots_and_sitemaps(result["performance"]["final_url"])
-    except Exception:
-        result["crawl_checks"] = {"robots_url": None, "blocked_by_robots": None, "sitemaps": []}
+    # 3-5) Robots/sitemaps, link sample and PSI are independent network
+    # probes against an already-parsed page, so they run concurrently.
+    final_url = result["performance"]["final_url"]
 
-    # 4) Link status sample (small in FAST mode)
-    try:
-        lim_int = 4 if FAST_SCAN else 10
-        lim_ext = 4 if FAST_SCAN else 10
-        result["link_checks"] = {
-            "internal": await _check_urls(result.get("internal_links", []), lim_int),
-            "external": await _check_urls(result.get("external_links", []), lim_ext),
-        }
-    except Exception:
-        result["link_checks"] = {"internal": [], "external": []}
+    async def _crawl() -> Dict[str, Any]:
+        try:
+            return await robots_and_sitemaps(final_url)
+        except Exception:
+            return {"robots_url": None, "blocked_by_robots": None, "sitemaps": []}
 
-    # 5) PageSpeed/CrUX (skipped in FAST mode)
-    try:
-        psi = await _fetch_psi(result["performance"]["final_url"])
-        result["pagespeed"] = psi
-        if psi.get("enabled"):
-            result.setdefault("performance", {})
-            result["performance"]["mobile_score"] = psi.get("mobile", {}).get("score")
-            result["performance"]["desktop_score"] = psi.get("desktop", {}).get("score")
-    except Exception as e:
-        result["pagespeed"] = {"enabled": False, "message": f"PSI error: {e}"}
+    async def _links() -> Dict[str, Any]:
+        try:
+            lim_int = 4 if FAST_SCAN else 10
+            lim_ext = 4 if FAST_SCAN else 10
+            internal, external = await asyncio.gather(
+                _check_urls(result.get("internal_links", []), lim_int),
+                _check_urls(result.get("external_links", []), lim_ext),
+            )
+            return {"internal": internal, "external": external}
+        except Exception:
+            return {"internal": [], "external": []}
+
+    async def _psi() -> Dict[str, Any]:
+        try:
+            return await _fetch_psi(final_url)
+        except Exception as e:
+            return {"enabled": False, "message": f"PSI error: {e}"}
+
+    result["crawl_checks"], result["link_checks"], psi = await asyncio.gather(
+        _crawl(), _links(), _psi()
+    )
+    result["pagespeed"] = psi
+    if psi.get("enabled"):
+        result["performance"]["mobile_score"] = psi.get("mobile", {}).get("score")
+        result["performance"]["desktop_score"] = psi.get("desktop", {}).get("score")
 
     return result
+
+
+async def analyze_many(urls: List[str], concurrency: int = 4) -> List[Dict[str, Any]]:
+    """Analyze several URLs concurrently, bounded so a big batch can't flood
+    the shared connection pool. Results keep the input order; a failed URL
+    yields an error dict instead of raising."""
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(u: str) -> Dict[str, Any]:
+        async with sem:
+            try:
+                return await analyze(u)
+            except Exception as e:
+                return {"url": u, "status_code": 0, "errors": [f"Analyze failed: {e}"]}
+
+    return list(await asyncio.gather(*(_one(u) for u in urls)))